@@ -19,12 +19,32 @@ Run `python find_annotation_discrepancies.py --help` for details.
 import sys
 import os
 import argparse
+from itertools import chain
 from lxml import etree
 
 # XML Schema namespace URI
 XSD_NS = "http://www.w3.org/2001/XMLSchema"
 NSMAP = {"xs": XSD_NS}
 
+# Shared parser: no ID/IDREF hash table and no limit on document size. Whitespace-only
+# text nodes are kept since <xs:documentation> text is compared verbatim (after strip()).
+PARSER = etree.XMLParser(remove_comments=False, collect_ids=False, huge_tree=True)
+
+# Precompiled XPath queries, compiled once at import instead of on every findall() call.
+# Globals with a missing or empty @name are dropped by the query itself.
+GLOBAL_ELEMENTS = etree.XPath("xs:element[@name != '']", namespaces=NSMAP)
+GLOBAL_ATTRIBUTES = etree.XPath("xs:attribute[@name != '']", namespaces=NSMAP)
+# Element and attribute reference sites, found in one descendant walk. Those without an
+# <xs:annotation> are never compared, so they are filtered out in C as well.
+ANNOTATED_REFS = etree.XPath(
+    "descendant::*[self::xs:element or self::xs:attribute][@ref][xs:annotation]", namespaces=NSMAP
+)
+
+# Clark-notation tags for matching nodes without going through XPath
+ELEMENT_TAG = f"{{{XSD_NS}}}element"
+ANNOTATION_TAG = f"{{{XSD_NS}}}annotation"
+DOCUMENTATION_TAG = f"{{{XSD_NS}}}documentation"
+
 
 def local_name(qname):
     """
@@ -32,11 +52,9 @@ def local_name(qname):
     """
     if qname is None:
         return None
-    if qname.startswith("{"):
-        return qname.split("}", 1)[1]
-    if ":" in qname:
-        return qname.split(":", 1)[1]
-    return qname
+    # rpartition() always yields a 3-tuple, so this covers both forms (and plain names)
+    # with two C-level scans and no intermediate list.
+    return qname.rpartition("}")[2].rpartition(":")[2]
 
 
 def get_annotation_text(node):
@@ -45,52 +63,71 @@ def get_annotation_text(node):
     child and collect all <xs:documentation> text under it. Return a single string
     (joined by newlines) or '' if no annotation/documentation is found.
     """
-    ann = node.find("xs:annotation", NSMAP)
-    if ann is None:
+    for ann in node:
+        if ann.tag == ANNOTATION_TAG:
+            break
+    else:
         return ""
-    docs = ann.findall("xs:documentation", NSMAP)
+    # Common shape: a single <xs:documentation> child, no list/join needed
+    if len(ann) == 1:
+        d = ann[0]
+        if d.tag == DOCUMENTATION_TAG:
+            return d.text.strip() if d.text else ""
     texts = []
-    for d in docs:
-        if d.text and d.text.strip():
+    for d in ann:
+        if d.tag == DOCUMENTATION_TAG and d.text and d.text.strip():
             texts.append(d.text.strip())
     return "\n".join(texts)
 
 
-def find_closest_global_ancestor(node, root):
+def find_closest_global_ancestor(node, root, cache=None):
     """
     For a given node (an lxml Element) inside the schema, return the nearest ancestor
     whose parent is root. If node itself is a direct child of root, return (None, None).
     Returns a tuple (ancestor_tag, ancestor_name), where ancestor_tag is 'xs:element'
     or 'xs:complexType', etc., and ancestor_name is its @name.
+
+    cache: optional dict shared between calls, mapping every ancestor already climbed
+    through to its result, so sibling references don't re-walk the same chain.
     """
     parent = node.getparent()
-    if parent is None or parent == root:
+    if parent is None or parent is root:
         return None, None
 
-    curr = parent
-    while curr is not None and curr.getparent() is not root:
-        curr = curr.getparent()
+    if cache is None:
+        cache = {}
 
-    if curr is None or curr.getparent() is None:
-        return None, None
+    path = []
+    curr = parent
+    while curr not in cache:
+        path.append(curr)
+        up = curr.getparent()
+        if up is root:
+            tag_local = curr.tag.rpartition("}")[2]  # e.g. "element", "complexType"
+            cache[curr] = (f"xs:{tag_local}", curr.get("name"))
+        elif up is None:
+            cache[curr] = (None, None)
+        else:
+            curr = up
 
-    tag_local = etree.QName(curr).localname  # e.g. "element", "complexType"
-    ancestor_tag = f"xs:{tag_local}"
-    ancestor_name = curr.get("name")
-    return ancestor_tag, ancestor_name
+    result = cache[curr]
+    for visited in path:
+        cache[visited] = result
+    return result
 
 
-def find_annotation_discrepancies(xsd_path):
+def iter_annotation_discrepancies(xsd_source):
     """
-    Parse the XSD at xsd_path. Collect:
+    Scan the XSD given by xsd_source: either its path, which is parsed here, or an
+    already-parsed lxml ElementTree (or its root Element). Collect:
       - All global <xs:element name="..."> and <xs:attribute name="..."> definitions,
         capturing their annotation text.
       - All <xs:element ref="..."> and <xs:attribute ref="..."> nodes that have an <xs:annotation>.
     For each reference with an annotation, compare the reference annotation vs. the global
-    definition annotation. If they differ, record a discrepancy.
+    definition annotation. If they differ, yield a discrepancy.
 
-    Returns:
-      discrepancies: a list of dicts with keys:
+    Yields, lazily and in document order (elements first, then attributes),
+      dicts with keys:
         'type'       -> 'element' or 'attribute'
         'name'       -> global name
         'def_text'   -> annotation text at definition ('' if none)
@@ -98,90 +135,124 @@ def find_annotation_discrepancies(xsd_path):
         'ref_line'   -> line number of the referencing node
         'ancestor_tag', 'ancestor_name' -> closest global ancestor info for the reference
     """
-    if not os.path.isfile(xsd_path):
-        print(f"Error: “{xsd_path}” does not exist or is not a file.")
-        sys.exit(1)
-
-    try:
-        parser = etree.XMLParser(remove_comments=False)
-        tree = etree.parse(xsd_path, parser)
-    except (etree.XMLSyntaxError, OSError) as e:
-        print(f"Failed to parse “{xsd_path}”: {e}")
-        sys.exit(1)
-
-    root = tree.getroot()
-    if root.tag != f"{{{XSD_NS}}}schema":
-        print("Warning: root element is not <xs:schema>. Proceeding anyway...")
+    if isinstance(xsd_source, (str, os.PathLike)):
+        xsd_path = xsd_source
+        if not os.path.isfile(xsd_path):
+            print(f"Error: “{xsd_path}” does not exist or is not a file.")
+            sys.exit(1)
+
+        try:
+            tree = etree.parse(xsd_path, PARSER)
+        except (etree.XMLSyntaxError, OSError) as e:
+            print(f"Failed to parse “{xsd_path}”: {e}")
+            sys.exit(1)
+
+        root = tree.getroot()
+        if root.tag != f"{{{XSD_NS}}}schema":
+            print("Warning: root element is not <xs:schema>. Proceeding anyway...")
+    else:
+        root = xsd_source.getroot() if hasattr(xsd_source, "getroot") else xsd_source
 
     # 1) Collect global element definitions and their annotation text
-    global_el_ann = {}   # name -> annotation text
-    for el in root.findall("xs:element", NSMAP):
-        name = el.get("name")
-        if name:
-            global_el_ann[name] = get_annotation_text(el)
+    global_el_ann = {el.get("name"): get_annotation_text(el) for el in GLOBAL_ELEMENTS(root)}
 
     # 2) Collect global attribute definitions and their annotation text
-    global_attr_ann = {}  # name -> annotation text
-    for attr in root.findall("xs:attribute", NSMAP):
-        name = attr.get("name")
-        if name:
-            global_attr_ann[name] = get_annotation_text(attr)
+    global_attr_ann = {attr.get("name"): get_annotation_text(attr) for attr in GLOBAL_ATTRIBUTES(root)}
 
-    discrepancies = []
+    ancestors = {}  # shared closest-global-ancestor cache for all reference sites
 
-    # 3) Check all <xs:element ref="..."> that have an annotation
-    for ref_node in root.findall(".//xs:element[@ref]", NSMAP):
+    # Attribute discrepancies are held back until all element ones have been yielded,
+    # keeping the report grouped by kind while walking the tree only once.
+    attribute_discrepancies = []
+
+    # 3) + 4) Check all <xs:element ref="..."> and <xs:attribute ref="..."> that have an annotation
+    for ref_node in ANNOTATED_REFS(root):
         ref_text = get_annotation_text(ref_node)
         # If reference has no annotation, skip entirely
         if not ref_text:
             continue
 
+        is_element = ref_node.tag == ELEMENT_TAG
+        global_ann = global_el_ann if is_element else global_attr_ann
         ref_q = ref_node.get("ref")
         name = local_name(ref_q)
-        if name is None or name not in global_el_ann:
+        if name is None or name not in global_ann:
             continue
 
-        def_text = global_el_ann.get(name, "")
+        def_text = global_ann.get(name, "")
         if def_text != ref_text:
             line = ref_node.sourceline
-            anc_tag, anc_name = find_closest_global_ancestor(ref_node, root)
-            discrepancies.append({
-                "type": "element",
+            anc_tag, anc_name = find_closest_global_ancestor(ref_node, root, ancestors)
+            discrepancy = {
+                "type": "element" if is_element else "attribute",
                 "name": name,
                 "def_text": def_text,
                 "ref_text": ref_text,
                 "ref_line": line,
                 "ancestor_tag": anc_tag,
                 "ancestor_name": anc_name
-            })
+            }
+            if is_element:
+                yield discrepancy
+            else:
+                attribute_discrepancies.append(discrepancy)
 
-    # 4) Check all <xs:attribute ref="..."> that have an annotation
-    for ref_node in root.findall(".//xs:attribute[@ref]", NSMAP):
-        ref_text = get_annotation_text(ref_node)
-        # Skip references without annotation
-        if not ref_text:
-            continue
+    yield from attribute_discrepancies
 
-        ref_q = ref_node.get("ref")
-        name = local_name(ref_q)
-        if name is None or name not in global_attr_ann:
-            continue
 
-        def_text = global_attr_ann.get(name, "")
-        if def_text != ref_text:
-            line = ref_node.sourceline
-            anc_tag, anc_name = find_closest_global_ancestor(ref_node, root)
-            discrepancies.append({
-                "type": "attribute",
-                "name": name,
-                "def_text": def_text,
-                "ref_text": ref_text,
-                "ref_line": line,
-                "ancestor_tag": anc_tag,
-                "ancestor_name": anc_name
-            })
+def find_annotation_discrepancies(xsd_source):
+    """
+    Same as iter_annotation_discrepancies(), but return all discrepancies as a list.
+    """
+    return list(iter_annotation_discrepancies(xsd_source))
 
-    return discrepancies
+
+def print_discrepancies_report(xsd_file, discrepancies):
+    """
+    Print the annotation-discrepancies report for xsd_file, consuming the discrepancies
+    iterator as returned by iter_annotation_discrepancies() (a list works too).
+    """
+    discrepancies = iter(discrepancies)
+    # Pull the first record before printing the header, so parse errors are reported first
+    first = next(discrepancies, None)
+
+    # Lines are buffered and written with one call per discrepancy, so output stays streamed
+    out = []
+    out.append(f"\n=== Annotation Discrepancies Report for “{xsd_file}” ===\n\n")
+
+    if first is None:
+        out.append("No annotation discrepancies found (or references without annotation were ignored).\n")
+        out.append("\nScan complete.\n\n")
+        sys.stdout.write("".join(out))
+        return
+
+    count = 0
+    for disc in chain((first,), discrepancies):
+        count += 1
+        typ = disc["type"]
+        name = disc["name"]
+        def_text = disc["def_text"] or "[None]"
+        ref_text = disc["ref_text"]  # guaranteed non-empty
+        line = disc["ref_line"]
+        anc_tag = disc["ancestor_tag"]
+        anc_name = disc["ancestor_name"]
+
+        out.append(f"Discrepancy for global xs:{typ} \"{name}\":\n")
+        out.append(f"  - Definition annotation: {def_text!r}\n")
+        if anc_tag:
+            out.append(
+                f"  - Reference at line {line} inside {anc_tag} name=\"{anc_name}\":\n"
+            )
+        else:
+            out.append(f"  - Reference at line {line} [GLOBAL CONTEXT]:\n")
+        out.append(f"      Reference annotation: {ref_text!r}\n")
+        out.append("\n")
+        sys.stdout.write("".join(out))
+        out.clear()
+
+    out.append(f"Total discrepancies found: {count}\n")
+    out.append("\nScan complete.\n\n")
+    sys.stdout.write("".join(out))
 
 
 def main():
@@ -202,37 +273,9 @@ def main():
     )
     args = parser.parse_args()
 
-    discrepancies = find_annotation_discrepancies(args.xsdfile)
-
-    print(f"\n=== Annotation Discrepancies Report for “{args.xsdfile}” ===\n")
-
-    if not discrepancies:
-        print("No annotation discrepancies found (or references without annotation were ignored).")
-        print("\nScan complete.\n")
-        return
-
-    for disc in discrepancies:
-        typ = disc["type"]
-        name = disc["name"]
-        def_text = disc["def_text"] or "[None]"
-        ref_text = disc["ref_text"]  # guaranteed non-empty
-        line = disc["ref_line"]
-        anc_tag = disc["ancestor_tag"]
-        anc_name = disc["ancestor_name"]
-
-        print(f"Discrepancy for global xs:{typ} \"{name}\":")
-        print(f"  - Definition annotation: {def_text!r}")
-        if anc_tag:
-            print(
-                f"  - Reference at line {line} inside {anc_tag} name=\"{anc_name}\":"
-            )
-        else:
-            print(f"  - Reference at line {line} [GLOBAL CONTEXT]:")
-        print(f"      Reference annotation: {ref_text!r}")
-        print()
+    discrepancies = iter_annotation_discrepancies(args.xsdfile)
 
-    print(f"Total discrepancies found: {len(discrepancies)}")
-    print("\nScan complete.\n")
+    print_discrepancies_report(args.xsdfile, discrepancies)
 
 
 if __name__ == "__main__":
@@ -16,198 +16,256 @@ Run `python find_missing_annotations.py --help` for details.
 import sys
 import os
 import argparse
+from itertools import count
+from operator import itemgetter
 from lxml import etree
 
 # XML Schema namespace URI.
 XSD_NS = "http://www.w3.org/2001/XMLSchema"
 NSMAP = {"xs": XSD_NS}
 
+# Parser settings for pure structural scanning: no ID/IDREF hash table, no limit on
+# document size, and no whitespace-only text nodes (no text content is consulted).
+PARSER_OPTIONS = {"collect_ids": False, "huge_tree": True, "remove_blank_text": True}
 
-def find_closest_global_ancestor(node, root):
+# Clark-notation tags of the scanned definitions, mapped to their report keys.
+SCANNED_TAGS = {
+    f"{{{XSD_NS}}}element": "xs:element",
+    f"{{{XSD_NS}}}attribute": "xs:attribute",
+    f"{{{XSD_NS}}}simpleType": "xs:simpleType",
+    f"{{{XSD_NS}}}complexType": "xs:complexType",
+}
+ANNOTATION_TAG = f"{{{XSD_NS}}}annotation"
+
+
+def find_closest_global_ancestor(node, root, cache=None):
     """
     Given a node (an lxml Element) and the schema root, return the nearest ancestor
     whose parent is the root. If node itself is global (parent == root), return None.
     Returns a tuple (ancestor_tag, ancestor_name) or (None, None) if node is global.
+
+    cache: optional dict shared between calls, mapping every ancestor already climbed
+    through to its result, so sibling nodes under the same global don't re-walk the chain.
     """
     parent = node.getparent()
     if parent is None:
         return None, None
 
     # If parent is root, then node is a global definition: no ancestor to report.
-    if parent == root:
+    if parent is root:
         return None, None
 
-    # Otherwise, climb until we find a child of root.
+    if cache is None:
+        cache = {}
+
+    # Otherwise, climb until we find a child of root (or an ancestor already resolved).
+    path = []
     curr = parent
-    while curr is not None and curr.getparent() is not root:
-        curr = curr.getparent()
+    while curr not in cache:
+        path.append(curr)
+        up = curr.getparent()
+        if up is root:
+            # curr is a direct child of root (i.e., a global <xs:element> or <xs:complexType>, etc.)
+            tag_local = curr.tag.rpartition("}")[2]  # e.g. "element", "complexType", etc.
+            cache[curr] = (f"xs:{tag_local}", curr.get("name"))
+        elif up is None:
+            # Shouldn't happen under well‐formed XSD, but treat as no global ancestor
+            cache[curr] = (None, None)
+        else:
+            curr = up
+
+    # Backfill every node climbed through with the resolved ancestor
+    result = cache[curr]
+    for visited in path:
+        cache[visited] = result
+    return result
+
+
+def collect_missing_annotations(events, discard=False):
+    """
+    Collect missing-annotation records from (event, node) pairs for the SCANNED_TAGS start
+    and end events, as produced by etree.iterparse() or etree.iterwalk(). With discard=True each
+    global definition is dropped from its tree once checked (for streaming parses);
+    otherwise the tree is left untouched.
+    Returns the dict described in find_missing_annotations().
+    """
+    # Prepare structure to collect missing-annotation records
+    missing = {
+        "xs:element": [],      # list of (name, line, ancestor_tag, ancestor_name)
+        "xs:attribute": [],    # list of (name, line, ancestor_tag, ancestor_name)
+        "xs:simpleType": [],   # list of (name, line, None, None)
+        "xs:complexType": []   # list of (name, line, None, None)
+    }
 
-    if curr is None or curr.getparent() is None:
-        # Shouldn't happen under well‐formed XSD, but treat as no global ancestor
-        return None, None
+    # Every scanned node is numbered when its start tag is seen (document order) and checked
+    # when its end tag is seen, i.e. once all of its children (including any <xs:annotation>) are available.
+    root = None
+    ancestors = {}  # ancestor cache, reset whenever a global definition completes
+    sequence = count()
+    order = {}  # document-order number of each scanned node still open
+    for event, node in events:
+        if root is None:
+            root = node.getroottree().getroot()
+        if event == "start":
+            order[node] = next(sequence)
+            continue
+        position = order.pop(node)
+
+        tag_key = SCANNED_TAGS[node.tag]
+        name = node.get("name")
+        # Skip anonymous definitions; only report nodes without an immediate <xs:annotation> child
+        if name is not None and node.find(ANNOTATION_TAG) is None:
+            line = node.sourceline
+            if tag_key in ("xs:element", "xs:attribute"):
+                # Find closest global ancestor for local elements/attributes
+                ancestor_tag, ancestor_name = find_closest_global_ancestor(node, root, ancestors)
+                missing[tag_key].append((position, (name, line, ancestor_tag, ancestor_name)))
+            else:
+                # For types, we don't need an ancestor
+                missing[tag_key].append((position, (name, line, None, None)))
+
+        if node.getparent() is root:
+            ancestors.clear()
+            if discard:
+                # Once a global definition is complete, none of its nodes are needed anymore:
+                # drop it (and any earlier siblings) to keep memory flat on large schemas.
+                node.clear()
+                while node.getprevious() is not None:
+                    del root[0]
+
+    # End events arrive children-first; restore document order (start order) for the report
+    for tag_key, entries in missing.items():
+        entries.sort(key=itemgetter(0))
+        missing[tag_key] = [record for _, record in entries]
 
-    # curr is now a direct child of root (i.e., a global <xs:element> or <xs:complexType>, etc.)
-    tag_local = etree.QName(curr).localname  # e.g. "element", "complexType", etc.
-    ancestor_tag = f"xs:{tag_local}"
-    ancestor_name = curr.get("name")
-    return ancestor_tag, ancestor_name
+    return missing
 
 
-def find_missing_annotations(xsd_path):
+def find_missing_annotations(xsd_source):
     """
-    Parse the XSD at xsd_path, then find all:
+    Find all:
       - xs:element
       - xs:attribute
       - xs:simpleType
       - xs:complexType
     (both global and local). For each, check if it has an <xs:annotation> child.
+    xsd_source is either the path of the XSD, which is stream-parsed in a single pass,
+    or an already-parsed lxml ElementTree (or its root Element), which is not modified.
     Return a dict mapping each tag to a list of tuples:
       - For xs:element or xs:attribute: (name, line, ancestor_tag, ancestor_name)
       - For xs:simpleType or xs:complexType: (name, line, None, None)
     """
+    if not isinstance(xsd_source, (str, os.PathLike)):
+        root = xsd_source.getroot() if hasattr(xsd_source, "getroot") else xsd_source
+        return collect_missing_annotations(etree.iterwalk(root, events=("start", "end"), tag=tuple(SCANNED_TAGS)))
+
+    xsd_path = xsd_source
     if not os.path.isfile(xsd_path):
         print(f"Error: “{xsd_path}” does not exist or is not a file.")
         sys.exit(1)
 
     try:
-        parser = etree.XMLParser(remove_comments=False)
-        tree = etree.parse(xsd_path, parser)
+        with open(xsd_path, "rb") as f:
+            context = etree.iterparse(f, events=("start", "end"), tag=tuple(SCANNED_TAGS), **PARSER_OPTIONS)
+            missing = collect_missing_annotations(context, discard=True)
     except (etree.XMLSyntaxError, OSError) as e:
         print(f"Failed to parse “{xsd_path}”: {e}")
         sys.exit(1)
 
-    root = tree.getroot()
-    if root.tag != f"{{{XSD_NS}}}schema":
+    if context.root.tag != f"{{{XSD_NS}}}schema":
         print("Warning: root element is not <xs:schema>. Proceeding anyway...")
 
-    # Prepare structure to collect missing-annotation records
-    missing = {
-        "xs:element": [],      # list of (name, line, ancestor_tag, ancestor_name)
-        "xs:attribute": [],    # list of (name, line, ancestor_tag, ancestor_name)
-        "xs:simpleType": [],   # list of (name, line, None, None)
-        "xs:complexType": []   # list of (name, line, None, None)
-    }
-
-    # Helper to check a given node for an <xs:annotation> child.
-    def check_node(node, tag_key):
-        """
-        node: an Element for xs:element / xs:attribute / xs:simpleType / xs:complexType
-        tag_key: string such as "xs:element" (must match the keys in `missing`)
-        """
-        name = node.get("name")
-        if name is None:
-            # Skip anonymous definitions
-            return
-
-        # Immediate <xs:annotation> child?
-        ann = node.find("xs:annotation", NSMAP)
-        if ann is None:
-            line = node.sourceline
-            if tag_key in ("xs:element", "xs:attribute"):
-                # Find closest global ancestor for local elements/attributes
-                ancestor_tag, ancestor_name = find_closest_global_ancestor(node, root)
-                missing[tag_key].append((name, line, ancestor_tag, ancestor_name))
-            else:
-                # For types, we don't need an ancestor
-                missing[tag_key].append((name, line, None, None))
-
-    # 1) Scan all <xs:element> nodes
-    for el in root.findall(".//xs:element", NSMAP):
-        check_node(el, "xs:element")
-
-    # 2) Scan all <xs:attribute> nodes
-    for attr in root.findall(".//xs:attribute", NSMAP):
-        check_node(attr, "xs:attribute")
-
-    # 3) Scan all <xs:simpleType> nodes
-    for st in root.findall(".//xs:simpleType", NSMAP):
-        check_node(st, "xs:simpleType")
-
-    # 4) Scan all <xs:complexType> nodes
-    for ct in root.findall(".//xs:complexType", NSMAP):
-        check_node(ct, "xs:complexType")
-
     return missing
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description=(
-            "Scan an XSD for any <xs:element>, <xs:attribute>, <xs:simpleType>, or <xs:complexType>\n"
-            "that does NOT have an <xs:annotation> child. For local elements/attributes, also report\n"
-            "the closest global ancestor (top-level element or type under <xs:schema>)."
-        ),
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-    )
-    parser.add_argument(
-        "xsdfile",
-        metavar="XSD_FILE",
-        help="Path to the XSD file to check for missing annotations",
-    )
-    args = parser.parse_args()
-
-    missing = find_missing_annotations(args.xsdfile)
-
-    print(f"\n=== Missing <xs:annotation> Report for “{args.xsdfile}” ===\n")
+def print_missing_report(xsd_file, missing):
+    """
+    Print the missing-annotation report for xsd_file, as returned by find_missing_annotations().
+    """
+    # The report is built as a list of lines and written out in one call
+    out = []
+    out.append(f"\n=== Missing <xs:annotation> Report for “{xsd_file}” ===\n\n")
 
     total_missing = 0
 
     # Elements
     entries = missing["xs:element"]
     if entries:
-        print("xs:element definitions WITHOUT <xs:annotation>:")
+        out.append("xs:element definitions WITHOUT <xs:annotation>:\n")
         for name, line, anc_tag, anc_name in entries:
             if anc_tag:
-                print(
+                out.append(
                     f"  - xs:element name=\"{name}\" (line {line}); "
-                    f"closest global ancestor: {anc_tag} name=\"{anc_name}\""
+                    f"closest global ancestor: {anc_tag} name=\"{anc_name}\"\n"
                 )
             else:
                 # Global element
-                print(f"  - xs:element name=\"{name}\" (line {line}); [GLOBAL]")
-        print()
+                out.append(f"  - xs:element name=\"{name}\" (line {line}); [GLOBAL]\n")
+        out.append("\n")
         total_missing += len(entries)
 
     # Attributes
     entries = missing["xs:attribute"]
     if entries:
-        print("xs:attribute definitions WITHOUT <xs:annotation>:")
+        out.append("xs:attribute definitions WITHOUT <xs:annotation>:\n")
         for name, line, anc_tag, anc_name in entries:
             if anc_tag:
-                print(
+                out.append(
                     f"  - xs:attribute name=\"{name}\" (line {line}); "
-                    f"closest global ancestor: {anc_tag} name=\"{anc_name}\""
+                    f"closest global ancestor: {anc_tag} name=\"{anc_name}\"\n"
                 )
             else:
                 # Global attribute
-                print(f"  - xs:attribute name=\"{name}\" (line {line}); [GLOBAL]")
-        print()
+                out.append(f"  - xs:attribute name=\"{name}\" (line {line}); [GLOBAL]\n")
+        out.append("\n")
         total_missing += len(entries)
 
     # SimpleTypes
     entries = missing["xs:simpleType"]
     if entries:
-        print("xs:simpleType definitions WITHOUT <xs:annotation>:")
+        out.append("xs:simpleType definitions WITHOUT <xs:annotation>:\n")
         for name, line, _, _ in entries:
-            print(f"  - xs:simpleType name=\"{name}\" (line {line})")
-        print()
+            out.append(f"  - xs:simpleType name=\"{name}\" (line {line})\n")
+        out.append("\n")
         total_missing += len(entries)
 
     # ComplexTypes
     entries = missing["xs:complexType"]
     if entries:
-        print("xs:complexType definitions WITHOUT <xs:annotation>:")
+        out.append("xs:complexType definitions WITHOUT <xs:annotation>:\n")
         for name, line, _, _ in entries:
-            print(f"  - xs:complexType name=\"{name}\" (line {line})")
-        print()
+            out.append(f"  - xs:complexType name=\"{name}\" (line {line})\n")
+        out.append("\n")
         total_missing += len(entries)
 
     if total_missing == 0:
-        print("All <xs:element>, <xs:attribute>, <xs:simpleType>, and <xs:complexType> definitions have annotations.")
+        out.append("All <xs:element>, <xs:attribute>, <xs:simpleType>, and <xs:complexType> definitions have annotations.\n")
     else:
-        print(f"Total items missing annotations: {total_missing}")
+        out.append(f"Total items missing annotations: {total_missing}\n")
+
+    out.append("\nScan complete.\n\n")
+    sys.stdout.write("".join(out))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Scan an XSD for any <xs:element>, <xs:attribute>, <xs:simpleType>, or <xs:complexType>\n"
+            "that does NOT have an <xs:annotation> child. For local elements/attributes, also report\n"
+            "the closest global ancestor (top-level element or type under <xs:schema>)."
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "xsdfile",
+        metavar="XSD_FILE",
+        help="Path to the XSD file to check for missing annotations",
+    )
+    args = parser.parse_args()
+
+    missing = find_missing_annotations(args.xsdfile)
 
-    print("\nScan complete.\n")
+    print_missing_report(args.xsdfile, missing)
 
 
 if __name__ == "__main__":
@@ -21,6 +21,14 @@ from lxml import etree
 # XML Schema namespace URI.
 XSD_NS = "http://www.w3.org/2001/XMLSchema"
 NSMAP = {"xs": XSD_NS}
+ELEMENT_TAG = f"{{{XSD_NS}}}element"
+ATTRIBUTE_TAG = f"{{{XSD_NS}}}attribute"
+# In XSD only <xs:extension> and <xs:restriction> can carry @base.
+BASE_TAGS = frozenset((f"{{{XSD_NS}}}extension", f"{{{XSD_NS}}}restriction"))
+
+# Parser settings for pure structural scanning: no ID/IDREF hash table, no limit on
+# document size, and no whitespace-only text nodes (no text content is consulted).
+PARSER_OPTIONS = {"collect_ids": False, "huge_tree": True, "remove_blank_text": True}
 
 
 def local_name(qname):
@@ -30,16 +38,89 @@ def local_name(qname):
     """
     if qname is None:
         return None
-    if qname.startswith("{"):
-        return qname.split("}", 1)[1]
-    if ":" in qname:
-        return qname.split(":", 1)[1]
-    return qname
+    # rpartition() always yields a 3-tuple, so this covers both forms (and plain names)
+    # with two C-level scans and no intermediate list.
+    return qname.rpartition("}")[2].rpartition(":")[2]
 
 
-def find_orphans(xsd_path):
+def collect_orphans(events, discard=False):
+    """
+    Collect definitions and references from (event, node) end-event pairs covering every
+    element of a schema, as produced by etree.iterparse() or etree.iterwalk(), and return
+    the orphan lists described in find_orphans(). With discard=True each top-level node is
+    dropped from its tree once processed (for streaming parses); otherwise the tree is left
+    untouched.
     """
-    Parse the given XSD file. Collect:
+    # All names are sys.intern()ed on insertion: the same name read from different nodes
+    # then becomes one object, and the final set differences compare by identity.
+    global_elements = set()
+    global_attributes = set()
+    global_simple_types = set()
+    global_complex_types = set()
+    # Global definitions under <xs:schema>, keyed by tag, collected into the sets above
+    global_defs = {
+        ELEMENT_TAG: global_elements,
+        ATTRIBUTE_TAG: global_attributes,
+        f"{{{XSD_NS}}}simpleType": global_simple_types,
+        f"{{{XSD_NS}}}complexType": global_complex_types,
+    }
+
+    referenced_elements = set()
+    referenced_attributes = set()
+    referenced_types = set()
+
+    # Definitions and references are collected as each node closes.
+    root = None
+    for _, node in events:
+        if root is None:
+            root = node.getroottree().getroot()
+        tag = node.tag
+
+        # 1) Global definitions (direct children of <xs:schema>)
+        is_global = node.getparent() is root
+        if is_global and tag in global_defs:
+            name = node.get("name")
+            if name:
+                global_defs[tag].add(sys.intern(name))
+
+        # 2) References to elements/attributes via ref="...", and
+        # 3) type="..." references (elements/attributes using a named type)
+        if tag == ELEMENT_TAG or tag == ATTRIBUTE_TAG:
+            local = local_name(node.get("ref"))
+            if local:
+                if tag == ELEMENT_TAG:
+                    referenced_elements.add(sys.intern(local))
+                else:
+                    referenced_attributes.add(sys.intern(local))
+            local = local_name(node.get("type"))
+            if local:
+                referenced_types.add(sys.intern(local))
+        elif tag in BASE_TAGS:
+            # 4) base="..." references (for extension/restriction under complexContent/simpleContent)
+            #    This also catches <xs:restriction base="..."> directly inside a simpleType or complexType.
+            local = local_name(node.get("base"))
+            if local:
+                referenced_types.add(sys.intern(local))
+
+        if is_global and discard:
+            # A completed top-level node is no longer needed: drop it (and earlier siblings)
+            # so memory stays bounded regardless of schema size.
+            node.clear()
+            while node.getprevious() is not None:
+                del root[0]
+
+    # 5) Compute orphans by set difference
+    orphan_elements = sorted(global_elements - referenced_elements)
+    orphan_attributes = sorted(global_attributes - referenced_attributes)
+    orphan_simple_types = sorted(global_simple_types - referenced_types)
+    orphan_complex_types = sorted(global_complex_types - referenced_types)
+
+    return orphan_elements, orphan_attributes, orphan_simple_types, orphan_complex_types
+
+
+def find_orphans(xsd_source):
+    """
+    Collect:
       - Global <xs:element name="..."> definitions.
       - Global <xs:attribute name="..."> definitions.
       - Global <xs:simpleType name="..."> definitions.
@@ -48,92 +129,80 @@ def find_orphans(xsd_path):
       - <xs:element ref="..."> and <xs:attribute ref="...">
       - Any @type="..." on <xs:element> or <xs:attribute>
       - Any @base="..." on xs:extension or xs:restriction under simpleContent/complexContent, or on <xs:restriction> directly.
+    xsd_source is either the path of the XSD, which is stream-parsed in a single pass,
+    or an already-parsed lxml ElementTree (or its root Element), which is not modified.
     Finally, compute which definitions never got referenced, returning four lists:
       (orphan_elements, orphan_attributes, orphan_simple_types, orphan_complex_types)
     """
+    if not isinstance(xsd_source, (str, os.PathLike)):
+        root = xsd_source.getroot() if hasattr(xsd_source, "getroot") else xsd_source
+        return collect_orphans(etree.iterwalk(root, events=("end",)))
+
+    xsd_path = xsd_source
     if not os.path.isfile(xsd_path):
         print(f"Error: “{xsd_path}” does not exist or is not a file.")
         sys.exit(1)
 
     try:
-        tree = etree.parse(xsd_path)
+        with open(xsd_path, "rb") as f:
+            context = etree.iterparse(f, events=("end",), **PARSER_OPTIONS)
+            orphans = collect_orphans(context, discard=True)
     except (etree.XMLSyntaxError, OSError) as e:
         print(f"Failed to parse “{xsd_path}”: {e}")
         sys.exit(1)
 
-    root = tree.getroot()
-    if root.tag != f"{{{XSD_NS}}}schema":
+    if context.root.tag != f"{{{XSD_NS}}}schema":
         print("Warning: root element is not <xs:schema>. Proceeding anyway...")
 
-    # 1) Collect all global definitions under <xs:schema>:
-    global_elements = set()
-    for el in root.findall("xs:element", NSMAP):
-        name = el.get("name")
-        if name:
-            global_elements.add(name)
+    return orphans
 
-    global_attributes = set()
-    for attr in root.findall("xs:attribute", NSMAP):
-        name = attr.get("name")
-        if name:
-            global_attributes.add(name)
 
-    global_simple_types = set()
-    for st in root.findall("xs:simpleType", NSMAP):
-        name = st.get("name")
-        if name:
-            global_simple_types.add(name)
+def print_orphans_report(xsd_file, orphans):
+    """
+    Print the orphan-definitions report for xsd_file, as returned by find_orphans().
+    """
+    orphans_el, orphans_attr, orphans_st, orphans_ct = orphans
 
-    global_complex_types = set()
-    for ct in root.findall("xs:complexType", NSMAP):
-        name = ct.get("name")
-        if name:
-            global_complex_types.add(name)
+    # The report is built as a list of lines and written out in one call
+    out = []
+    out.append(f"\n=== Scan of “{xsd_file}” for orphan global definitions ===\n\n")
 
-    # 2) Find all references to elements/attributes via ref="..."
-    referenced_elements = set()
-    for el in root.findall(".//xs:element[@ref]", NSMAP):
-        ref_qname = el.get("ref")
-        local = local_name(ref_qname)
-        if local:
-            referenced_elements.add(local)
+    if orphans_el:
+        out.append("Orphan global <xs:element> definitions (never used via ref):\n")
+        for name in orphans_el:
+            out.append(f"  - {name}\n")
+    else:
+        out.append("No orphan global <xs:element> definitions found.\n")
 
-    referenced_attributes = set()
-    for attr in root.findall(".//xs:attribute[@ref]", NSMAP):
-        ref_qname = attr.get("ref")
-        local = local_name(ref_qname)
-        if local:
-            referenced_attributes.add(local)
+    out.append("\n")
 
-    # 3) Find all type="..." references (elements/attributes using a named type)
-    referenced_types = set()
-    for el in root.findall(".//xs:element[@type]", NSMAP):
-        type_qname = el.get("type")
-        local = local_name(type_qname)
-        if local:
-            referenced_types.add(local)
-
-    for attr in root.findall(".//xs:attribute[@type]", NSMAP):
-        type_qname = attr.get("type")
-        local = local_name(type_qname)
-        if local:
-            referenced_types.add(local)
-
-    # 4) Find all base="..." references (for extension/restriction under complexContent/simpleContent)
-    #    This also catches <xs:restriction base="..."> directly inside a simpleType or complexType.
-    for node in root.findall(".//*[@base]", NSMAP):
-        base_qname = node.get("base")
-        local = local_name(base_qname)
-        if local:
-            referenced_types.add(local)
+    if orphans_attr:
+        out.append("Orphan global <xs:attribute> definitions (never used via ref):\n")
+        for name in orphans_attr:
+            out.append(f"  - {name}\n")
+    else:
+        out.append("No orphan global <xs:attribute> definitions found.\n")
 
-    # 5) Compute orphans by set difference
-    orphan_elements = sorted(global_elements - referenced_elements)
-    orphan_attributes = sorted(global_attributes - referenced_attributes)
-    orphan_simple_types = sorted(global_simple_types - referenced_types)
-    orphan_complex_types = sorted(global_complex_types - referenced_types)
+    out.append("\n")
 
-    return orphan_elements, orphan_attributes, orphan_simple_types, orphan_complex_types
+    if orphans_st:
+        out.append("Orphan global <xs:simpleType> definitions (never used via type/base):\n")
+        for name in orphans_st:
+            out.append(f"  - {name}\n")
+    else:
+        out.append("No orphan global <xs:simpleType> definitions found.\n")
+
+    out.append("\n")
+
+    if orphans_ct:
+        out.append("Orphan global <xs:complexType> definitions (never used via type/base):\n")
+        for name in orphans_ct:
+            out.append(f"  - {name}\n")
+    else:
+        out.append("No orphan global <xs:complexType> definitions found.\n")
+
+    out.append("\nScan complete.\n\n")
+    sys.stdout.write("".join(out))
 
 
 def main():
@@ -154,46 +223,9 @@ def main():
     )
     args = parser.parse_args()
 
-    xsd_file = args.xsdfile
-    orphans_el, orphans_attr, orphans_st, orphans_ct = find_orphans(xsd_file)
-
-    print(f"\n=== Scan of “{xsd_file}” for orphan global definitions ===\n")
-
-    if orphans_el:
-        print("Orphan global <xs:element> definitions (never used via ref):")
-        for name in orphans_el:
-            print(f"  - {name}")
-    else:
-        print("No orphan global <xs:element> definitions found.")
-
-    print()
-
-    if orphans_attr:
-        print("Orphan global <xs:attribute> definitions (never used via ref):")
-        for name in orphans_attr:
-            print(f"  - {name}")
-    else:
-        print("No orphan global <xs:attribute> definitions found.")
-
-    print()
-
-    if orphans_st:
-        print("Orphan global <xs:simpleType> definitions (never used via type/base):")
-        for name in orphans_st:
-            print(f"  - {name}")
-    else:
-        print("No orphan global <xs:simpleType> definitions found.")
-
-    print()
-
-    if orphans_ct:
-        print("Orphan global <xs:complexType> definitions (never used via type/base):")
-        for name in orphans_ct:
-            print(f"  - {name}")
-    else:
-        print("No orphan global <xs:complexType> definitions found.")
+    orphans = find_orphans(args.xsdfile)
 
-    print("\nScan complete.\n")
+    print_orphans_report(args.xsdfile, orphans)
 
 
 if __name__ == "__main__":
@@ -1,40 +1,137 @@
 from lxml import etree
 import difflib
 import argparse
+import copy
+import logging
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+XS_NS = 'http://www.w3.org/2001/XMLSchema'
+
+# XSD components to compare
+COMPONENTS = ['element', 'attribute', 'simpleType', 'complexType']
+
+# Clark-notation tag of each component, mapped to its component name
+_COMPONENT_TAGS = {f"{{{XS_NS}}}{comp}": comp for comp in COMPONENTS}
+
+# Attribute names and prefixed values rewritten by the prefix removal
+_WORD = re.compile(r'\w+')
+_PREFIXED_VALUE = re.compile(r'[\w\-]+')
+
+# Cleaning patterns compiled so far, keyed by (prefix, ignore_name)
+_CLEANERS = {}
+
+# Build the single-pass cleaning pattern used by extract_element_as_string
+def build_cleaner(prefix, ignore_name=True):
+    """Compile one alternation covering every normalization step, so the serialized element is scanned once."""
+    cleaner = _CLEANERS.get((prefix, ignore_name))
+    if cleaner is not None:
+        return cleaner
+    # With ignore_name, name="..." is removed rather than stripped of its prefix, including at the end
+    # of a longer attribute name (e.g. xname="..."), as the separate name removal did
+    attr = r'(?!\w*name=")' if ignore_name else ''
+    alternatives = [
+        r'(?P<xmlns>\s+xmlns(?::\w+)?="[^"]*")',                  # xmlns declarations
+        r'(?P<gap>>\s+<)',                                         # whitespace between > and <
+        rf'(?P<prefixed>\s+{attr}(?P<attr>\w+="){re.escape(prefix)}_(?P<value>[\w\-]+"))',  # prefix in attribute values
+        r'(?P<space>\s+)',                                         # any other run of whitespace
+    ]
+    if ignore_name:
+        alternatives.append(r'(?P<name>name="[^"]*")')
+    cleaner = _CLEANERS[(prefix, ignore_name)] = re.compile('|'.join(alternatives))
+    return cleaner
 
 # Function to extract XML content as a string
 def extract_element_as_string(element, prefix, ignore_name=True):
     """Convert XML element to a formatted string for comparison, flattening whitespace and ignoring xmlns attributes."""
     raw_string = etree.tostring(element, pretty_print=True, encoding='unicode')
-    # Remove xmlns declarations
-    raw_string = re.sub(r'\s+xmlns(:\w+)?="[^"]*"', '', raw_string)
-    # Replace all consecutive whitespace with a single space
-    raw_string = re.sub(r'\s+', ' ', raw_string).strip()
-    # Remove all whitespace between > and <
-    raw_string = re.sub(r'>\s+<', '><', raw_string)
+    count = 0
 
-    if ignore_name:
-        # Remove the 'name' attribute specifically
-        raw_string = re.sub(r'name="[^"]*"', '', raw_string)
-    # Remove prefix in any attribute value
-    raw_string, count = re.subn(rf'(\s\w+="){prefix}_([\w\-]+)(")', r'\1\2\3', raw_string)
-    print(f"DEBUG: After removing '{prefix}' prefixes in attributes: (Replacements made: {count})")
+    def substitute(match):
+        nonlocal count
+        kind = match.lastgroup
+        if kind == 'prefixed':
+            # Remove prefix in any attribute value
+            count += 1
+            return ' ' + match.group('attr') + match.group('value')
+        if kind == 'space':
+            # Replace consecutive whitespace with a single space
+            return ' '
+        if kind == 'gap':
+            return '><'
+        # xmlns declarations and the 'name' attribute are removed
+        return ''
+
+    raw_string = build_cleaner(prefix, ignore_name).sub(substitute, raw_string).strip()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("After removing '%s' prefixes in attributes: (Replacements made: %d)", prefix, count)
     return raw_string
 
-# Function to find matching elements by tag name in the XSD
-def find_matching_element(schema_root, tag, name):
-    """Find an element with a specific name in the XSD schema."""
-    xpath_query = f"//xs:{tag}[@name='{name}']"
-    return schema_root.xpath(xpath_query, namespaces={'xs': 'http://www.w3.org/2001/XMLSchema'})
+# Function to get the canonical form of an element
+def canonicalize_element(element, prefix, ignore_name=True):
+    """Return the C14N bytes of a copy of the element without whitespace-only text, 'name' attributes or prefixes in attribute values."""
+    element = copy.deepcopy(element)
+    value_prefix = f"{prefix}_"
+    value_start = len(value_prefix)
+    for node in element.iter():
+        if node.text is not None and not node.text.strip():
+            node.text = None
+        if node.tail is not None and not node.tail.strip():
+            node.tail = None
+        if not isinstance(node.tag, str):
+            continue  # comments and processing instructions have no attributes
+        if ignore_name:
+            node.attrib.pop('name', None)
+        for key, value in node.items():
+            if (value.startswith(value_prefix) and _WORD.fullmatch(key)
+                    and _PREFIXED_VALUE.fullmatch(value, value_start)):
+                node.set(key, value[value_start:])
+    return etree.tostring(element, method='c14n')
+
+# Function to index the components of the XSD by tag name and name
+def index_components(schema_root):
+    """Map (tag, name) to the first component with that name, in a single pass over the XSD."""
+    index = {}
+    for element in schema_root.iter(*_COMPONENT_TAGS):
+        name = element.get('name')
+        if name is not None:
+            index.setdefault((_COMPONENT_TAGS[element.tag], name), element)
+    return index
+
+# Function to collect the prefixed components of the XSD
+def index_prefixed_components(schema_root, prefix):
+    """Map each component to its elements whose name starts with the prefix, in document order, in a single pass over the XSD."""
+    index = {comp: [] for comp in COMPONENTS}
+    name_prefix = f"{prefix}_"
+    for element in schema_root.iter(*_COMPONENT_TAGS):
+        if element.get('name', '').startswith(name_prefix):
+            index[_COMPONENT_TAGS[element.tag]].append(element)
+    return index
 
 # Function to compare two elements and print differences
 def compare_elements(element1, element2, prefix):
     """Compare two XML elements and return the differences ignoring the name attribute."""
+    # Elements with different tags or child counts can't be equivalent: skip canonicalization
+    if element1.tag == element2.tag and len(element1) == len(element2):
+        try:
+            # Equivalent XML needs no text normalization or diff
+            if canonicalize_element(element1, prefix) == canonicalize_element(element2, prefix):
+                return "OK"
+        except etree.C14NError:
+            pass  # e.g. relative namespace URIs: fall back to the text comparison
+
     str1 = extract_element_as_string(element1, prefix)
     str2 = extract_element_as_string(element2, prefix)
-    
-    diff = list(difflib.unified_diff(str1.splitlines(), str2.splitlines(),
+    if str1 == str2:
+        return "OK"
+
+    # The normalized strings are single lines: diff them tag by tag instead
+    tokens1 = str1.replace('><', '>\n<').splitlines()
+    tokens2 = str2.replace('><', '>\n<').splitlines()
+    diff = list(difflib.unified_diff(tokens1, tokens2,
                                      fromfile='original', tofile='copy', lineterm=''))
     return '\n'.join(diff) if diff else "OK"
 
@@ -48,27 +145,37 @@ def compare_xsd_files(prefix, original_file, copy_file):
     original_root = original_tree.getroot()
     copy_root = copy_tree.getroot()
     
-    # XSD components to compare
-    components = ['element', 'attribute', 'simpleType', 'complexType']
+    # Look up original components by (tag, name) instead of searching the tree each time
+    original_index = index_components(original_root)
+    copy_index = index_prefixed_components(copy_root, prefix)
     
-    for component in components:
-        # Find all matching components in the "copy" XSD that start with the prefix
-        matching_elements = copy_root.xpath(f"//xs:{component}[starts-with(@name, '{prefix}_')]",
-                                           namespaces={'xs': 'http://www.w3.org/2001/XMLSchema'})
-        
-        for copy_element in matching_elements:
+    # Pair every prefixed component of the "copy" XSD with its original (None if missing)
+    pairs = []
+    for component in COMPONENTS:
+        # All matching components in the "copy" XSD that start with the prefix
+        for copy_element in copy_index[component]:
             # Extract name without prefix
             original_name = copy_element.attrib['name'][len(prefix) + 1:]
             
             # Search for the corresponding element in the original file
-            original_elements = find_matching_element(original_root, component, original_name)
-            
-            if not original_elements:
+            original_element = original_index.get((component, original_name))
+            pairs.append((component, original_name, original_element, copy_element))
+
+    def compare_pair(pair):
+        _, _, original_element, copy_element = pair
+        if original_element is None:
+            return None
+        # Compare the two elements ignoring the name attribute
+        return compare_elements(original_element, copy_element, prefix)
+
+    # The comparisons only read the parsed trees, so they run in parallel;
+    # results come back in order and are printed as before
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = executor.map(compare_pair, pairs)
+        for (component, original_name, _, copy_element), diff_result in zip(pairs, results):
+            if diff_result is None:
                 print(f"No matching '{component}' for '{copy_element.attrib['name']}' in original file.")
                 continue
-            
-            # Compare the two elements ignoring the name attribute
-            diff_result = compare_elements(original_elements[0], copy_element, prefix)
             print(f"\nComparison for {component} (Original: '{original_name}', Copy: '{copy_element.attrib['name']}'): ")
             print(diff_result)
 
@@ -78,7 +185,11 @@ if __name__ == "__main__":
     parser.add_argument("prefix", help="The prefix string to match in the copy XSD file.")
     parser.add_argument("original_file", help="Path to the original XSD file.")
     parser.add_argument("copy_file", help="Path to the copy XSD file.")
+    parser.add_argument("-d", "--debug", action="store_true", help="Print the prefix replacements made in each compared element.")
     args = parser.parse_args()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG, format="%(levelname)s: %(message)s")
     
     compare_xsd_files(args.prefix, args.original_file, args.copy_file)
 
@@ -2,29 +2,43 @@ import os
 import sys
 import argparse
 from lxml import etree
+from xsd_parser import PARSER
 
-def flatten_xsd(input_file, output_file=None):
-    if not os.path.isfile(input_file):
-        raise FileNotFoundError(f"Input file '{input_file}' not found.")
-
-    if output_file is None:
-        base, ext = os.path.splitext(input_file)
-        output_file = f"{base}_flattened{ext}"
-
-    parser = etree.XMLParser(remove_blank_text=True)
-    tree = etree.parse(input_file, parser)
+def flatten_xsd_tree(tree, base_path, schemas=None):
+    """
+    Resolve the <xs:include> elements of a parsed schema in place, recursively, and return the tree.
+    Relative schemaLocations are resolved against base_path. schemas optionally maps the real path
+    of an included file to an already-parsed tree of it, used instead of reading the file; its
+    children are moved into the flattened schema.
+    """
+    if schemas is None:
+        schemas = {}
     root = tree.getroot()
 
+    # Schemas already merged (by real path): including one again is a no-op in XSD,
+    # so diamond-shaped include graphs parse each file only once
+    seen = set()
+    if tree.docinfo.URL:
+        seen.add(os.path.realpath(tree.docinfo.URL))
+
     def resolve_includes(element, base_path):
         for include in element.findall("{http://www.w3.org/2001/XMLSchema}include"):
             schema_location = include.get("schemaLocation")
             if schema_location:
                 included_path = os.path.join(base_path, schema_location)
-                if not os.path.isfile(included_path):
-                    raise FileNotFoundError(f"Included file '{included_path}' not found.")
+                key = os.path.realpath(included_path)
+                if key in seen:
+                    element.remove(include)
+                    continue
+                seen.add(key)
 
-                included_tree = etree.parse(included_path, parser)
-                included_root = included_tree.getroot()
+                if key in schemas:
+                    included_root = schemas[key].getroot()
+                else:
+                    if not os.path.isfile(included_path):
+                        raise FileNotFoundError(f"Included file '{included_path}' not found.")
+                    included_tree = etree.parse(included_path, PARSER)
+                    included_root = included_tree.getroot()
                 resolve_includes(included_root, os.path.dirname(included_path))
 
                 # Insert included content into the main schema
@@ -34,7 +48,19 @@ def flatten_xsd(input_file, output_file=None):
                 # Remove the <xs:include> element after processing
                 element.remove(include)
 
-    resolve_includes(root, os.path.dirname(input_file))
+    resolve_includes(root, base_path)
+    return tree
+
+def flatten_xsd(input_file, output_file=None, schemas=None):
+    if not os.path.isfile(input_file):
+        raise FileNotFoundError(f"Input file '{input_file}' not found.")
+
+    if output_file is None:
+        base, ext = os.path.splitext(input_file)
+        output_file = f"{base}_flattened{ext}"
+
+    tree = etree.parse(input_file, PARSER)
+    flatten_xsd_tree(tree, os.path.dirname(input_file), schemas)
 
     tree.write(output_file, pretty_print=True, xml_declaration=True, encoding="UTF-8")
     print(f"Flattened schema saved to '{output_file}'")
@@ -1,9 +1,11 @@
 import argparse
 import os
 import shutil
+from lxml import etree
 from xsd_import2include import xsd_import2include
-from sort_xsd import sort_xsd
+from sort_xsd import sort_xsd_tree
 from flatten_include import flatten_xsd
+from xsd_parser import PARSER
 
 def flatten_xsd_pipeline(input_xsd, output_xsd, debuglevel, exclude_file):
     """
@@ -19,20 +21,18 @@ def flatten_xsd_pipeline(input_xsd, output_xsd, debuglevel, exclude_file):
         debuglevel (int): Debug verbosity level.
     """
     # Step 1: Convert <xs:import> to <xs:include>
-    processed_main_xsd, included_xsd = xsd_import2include(input_xsd, exclude_file, debuglevel)
+    # (the intermediate files are parsed back without blank text and then removed, so they are not indented)
+    processed_main_xsd, included_xsd = xsd_import2include(input_xsd, exclude_file, debuglevel, pretty_print=False)
 
     if not processed_main_xsd or not included_xsd:
         raise FileNotFoundError("Processing <xs:import> to <xs:include> failed.")
 
-    # Step 2: Sort the included XSD
-    sorted_xsd = included_xsd.replace('.xsd', '_sorted.xsd')
-    sort_xsd(included_xsd, sorted_xsd)
+    # Step 2: Sort the included XSD, in memory
+    included_tree = sort_xsd_tree(etree.parse(included_xsd, PARSER))
 
-    # Replace the original included XSD with the sorted one
-    os.rename(sorted_xsd, included_xsd)
-
-    # Step 3: Flatten the processed main XSD
-    flatten_xsd(processed_main_xsd, output_xsd)
+    # Step 3: Flatten the processed main XSD, taking the sorted tree for the included XSD
+    # instead of writing it out and parsing it back
+    flatten_xsd(processed_main_xsd, output_xsd, {os.path.realpath(included_xsd): included_tree})
     if debuglevel >= 1:
         print(f"INFO: Flattened XSD saved to: {output_xsd}")
 
@@ -1,54 +1,65 @@
 import argparse
-import xml.etree.ElementTree as ET
+import lxml.etree as ET
+from xsd_parser import PARSER
 
-def sort_xsd(file_path, output_path=None, name_first=False):
+def sort_xsd_tree(tree, name_first=False):
     """
-    Sort an XSD file alphabetically by kind and name (default) or name and kind.
+    Sort the top-level definitions of a parsed XSD in place, by kind and name (default) or name and kind.
 
     Parameters:
-        file_path (str): Path to the input XSD file.
-        output_path (str): Path to save the sorted XSD file (optional).
+        tree (ElementTree): The parsed XSD.
         name_first (bool): If True, sort by name first, then kind. Default is kind first.
 
     Returns:
-        str: The path to the sorted XSD file.
+        ElementTree: The same tree, sorted.
     """
-    # Parse the XSD file
-    tree = ET.parse(file_path)
     root = tree.getroot()
 
     # Namespace dictionary for XPath queries
     ns = {'xs': 'http://www.w3.org/2001/XMLSchema'}
 
     # Find all top-level elements in the schema
-    elements = list(root.findall("xs:*", ns))
+    elements = root.xpath("xs:*", namespaces=ns)
 
-    # Define custom kind order
-    kind_order = {"element": 0, "complexType": 1, "simpleType": 2, "attribute": 3}
+    # Define custom kind order, keyed by the full tag so no local name has to be extracted
+    kind_order = {f"{{{ns['xs']}}}{kind}": index
+                  for index, kind in enumerate(["element", "complexType", "simpleType", "attribute"])}
 
     # Sort elements by the specified order
     def sort_key(element):
-        kind = element.tag.split('}')[-1]  # Extract kind (e.g., 'element', 'complexType')
-        kind_index = kind_order.get(kind, 99)  # Default to 99 if kind is not in the order
-        name = element.attrib.get('name', '')  # Extract name (default to empty if not present)
+        kind_index = kind_order.get(element.tag, 99)  # Default to 99 if kind is not in the order
+        name = element.get('name', '')  # Extract name (default to empty if not present)
         return (name, kind_index) if name_first else (kind_index, name)
 
     sorted_elements = sorted(elements, key=sort_key)
 
-    # Remove all existing elements from the root
-    for elem in elements:
-        root.remove(elem)
+    # Replace the root's children in one slice assignment; comments and other
+    # non-XSD children keep their place ahead of the sorted definitions
+    sorted_set = set(elements)
+    root[:] = [child for child in root if child not in sorted_set] + sorted_elements
+
+    return tree
+
+def sort_xsd(file_path, output_path=None, name_first=False):
+    """
+    Sort an XSD file alphabetically by kind and name (default) or name and kind.
+
+    Parameters:
+        file_path (str): Path to the input XSD file.
+        output_path (str): Path to save the sorted XSD file (optional).
+        name_first (bool): If True, sort by name first, then kind. Default is kind first.
 
-    # Append sorted elements back to the root
-    for elem in sorted_elements:
-        root.append(elem)
+    Returns:
+        str: The path to the sorted XSD file.
+    """
+    tree = sort_xsd_tree(ET.parse(file_path, PARSER), name_first)
 
     # Determine output file path
     if not output_path:
         output_path = file_path.replace('.xsd', '_sorted.xsd')
 
-    # Write the sorted tree to the output file
-    tree.write(output_path, encoding='utf-8', xml_declaration=True)
+    # Write the sorted tree to the output file (which may be the input file: it is fully parsed by now)
+    tree.write(output_path, encoding='utf-8', xml_declaration=True, pretty_print=True)
     
     return output_path
 
@@ -1,20 +1,42 @@
 import os
+import sys
+import io
+import copy
+import contextlib
 import lxml.etree as ET
 import argparse
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from xsd_parser import PARSER
 
+# Usage-specific attributes dropped from a copied top-level definition
+_DROP_ATTRS = frozenset(("minOccurs", "maxOccurs", "nillable", "use"))
+# Attributes referring to other definitions, renamed along with them
+_REF_ATTRS = ("type", "ref", "base")
 
-def read_exclude_file(exclude_file):
+
+def read_exclude_file(exclude_file, debuglevel=0):
     excluded_items = set()
     if exclude_file and os.path.isfile(exclude_file):
         with open(exclude_file, "r", encoding="utf-8") as f:
             excluded_items = {line.strip() for line in f if line.strip()}
-    print(f"Excluding items from renaming: {excluded_items}")
+    if debuglevel:
+        print(f"INFO: Excluding items from renaming: {excluded_items}")
     return excluded_items
 
 
+def parse_xsd(xsd_source):
+    """
+    Return the parsed tree of xsd_source: either a path, or an already-parsed lxml ElementTree returned as is.
+    """
+    if isinstance(xsd_source, (str, os.PathLike)):
+        return ET.parse(xsd_source, PARSER)
+    return xsd_source
+
+
 def resolve_dependencies(tree, references, xs_ns, debuglevel):
     """
-    Recursively find all required definitions based on the references.
+    Find all required definitions based on the references, following their dependencies transitively.
     """
     root = tree.getroot()
     definitions = {
@@ -26,37 +48,65 @@ def resolve_dependencies(tree, references, xs_ns, debuglevel):
     }
     processed = set()
 
+    # Index the named definitions of each kind in one pass. The first one in document order wins,
+    # as with a search of the whole tree; global elements, which take precedence, get their own index.
+    index = {"simpleType": {}, "complexType": {}, "element": {}, "attribute": {}, "group": {}}
+    global_elements = {}
+    kinds = {f"{{{xs_ns}}}{kind}": kind for kind in index}
+    simple_type_tag = f"{{{xs_ns}}}simpleType"
+    complex_type_tag = f"{{{xs_ns}}}complexType"
+    element_tag = f"{{{xs_ns}}}element"
+    attribute_tag = f"{{{xs_ns}}}attribute"
+    for elem in root.iter(*kinds):
+        name = elem.get("name")
+        if name is None:
+            continue
+        kind = kinds[elem.tag]
+        index[kind].setdefault(name, elem)
+        if kind == "element" and elem.getparent() is root:
+            global_elements.setdefault(name, elem)
+
+    def type_kinds(ref):
+        # A type/base reference is only looked up as the kind(s) the name is defined as; as both if neither
+        name = ref.strip()
+        kinds = [kind for kind in ("simpleType", "complexType") if name in index[kind]]
+        return kinds or ["simpleType", "complexType"]
+
     def resolve_reference(ref, ref_type):
-        # Normalize and skip already processed references
-        normalized_ref = ref.strip()
-        if (normalized_ref, ref_type) in processed:
+        # Dependencies are resolved depth-first from an explicit stack rather than by recursion. An entry
+        # carrying a definition is the inline type check of that definition, run once its dependencies are done.
+        stack = [(ref, ref_type, None)]
+        while stack:
+            ref, ref_type, definition = stack.pop()
+            if definition is not None:
+                resolve_inline_type(ref, ref_type, definition)
+                continue
+
+            # Normalize and skip already processed references
+            normalized_ref = ref.strip()
+            if (normalized_ref, ref_type) in processed:
+                if debuglevel >= 2:
+                    print(f"DEBUG: Skipping already processed reference: {normalized_ref} ({ref_type})")
+                continue
+
             if debuglevel >= 2:
-                print(f"DEBUG: Skipping already processed reference: {normalized_ref} ({ref_type})")
-            return
+                print(f"DEBUG: Processing reference: {normalized_ref} ({ref_type})")
+            processed.add((normalized_ref, ref_type))
+
+            # Find the definition
+            if ref_type == "element":
+                definition = global_elements.get(normalized_ref)
+                if definition is None:
+                    # Fallback to a broader search if the global definition is not found
+                    definition = index["element"].get(normalized_ref)
+                #print(f"XPath for definition: {definition.getroottree().getpath(definition)}")
+            elif ref_type in index:
+                definition = index[ref_type].get(normalized_ref)
 
-        if debuglevel >= 2:
-            print(f"DEBUG: Processing reference: {normalized_ref} ({ref_type})")
-        processed.add((normalized_ref, ref_type))
-
-        # Find the definition
-        definition = None
-        if ref_type == "simpleType":
-            definition = root.find(f".//xs:simpleType[@name='{normalized_ref}']", namespaces={"xs": xs_ns})
-        elif ref_type == "complexType":
-            definition = root.find(f".//xs:complexType[@name='{normalized_ref}']", namespaces={"xs": xs_ns})
-        elif ref_type == "element":
-            definition = root.find(f"./xs:element[@name='{normalized_ref}']", namespaces={"xs": xs_ns})
             if definition is None:
-                # Fallback to a broader search if the global definition is not found
-                definition = root.find(f".//xs:element[@name='{normalized_ref}']", namespaces={"xs": xs_ns})
-            #definition = root.find(f".//xs:element[@name='{normalized_ref}']", namespaces={"xs": xs_ns})
-            #print(f"XPath for definition: {definition.getroottree().getpath(definition)}")
-        elif ref_type == "attribute":
-            definition = root.find(f".//xs:attribute[@name='{normalized_ref}']", namespaces={"xs": xs_ns})
-        elif ref_type == "group":
-            definition = root.find(f".//xs:group[@name='{normalized_ref}']", namespaces={"xs": xs_ns})
-
-        if definition is not None:
+                print(f"WARNING: Definition for reference '{normalized_ref}' ({ref_type}) not found in schema.")
+                continue
+
             definitions[ref_type + "s"][normalized_ref] = definition
             if debuglevel >= 2:
                 print(f"DEBUG: Resolved definition: {normalized_ref} ({ref_type}), Tag: {definition.tag}")
@@ -66,49 +116,67 @@ def resolve_dependencies(tree, references, xs_ns, debuglevel):
             #    print(elem.tag, elem.attrib)
             #print("*** END DEBUG all ***")
 
-            # Recursively resolve dependencies
-            for dep_attr in ["type", "base", "ref", "group"]:
+            # Collect the nodes carrying each dependency attribute in a single pass over the definition
+            dependencies = {"type": [], "base": [], "ref": [], "group": []}
+            for elem in definition.iter(ET.Element):
+                attrib = elem.attrib
+                for dep_attr, ref_elems in dependencies.items():
+                    if dep_attr in attrib:
+                        ref_elems.append(elem)
+
+            # Gather the dependencies to resolve, in the order the recursion used to visit them
+            pending = []
+            for dep_attr, ref_elems in dependencies.items():
                 if debuglevel >= 2:
                     print(f"DEBUG: Looking for {dep_attr} dependencies")
-                for ref_elem in [definition] + definition.findall(f".//*[@{dep_attr}]", namespaces={"xs": xs_ns}):
+                for ref_elem in ref_elems:
+                    dep_ref = ref_elem.get(dep_attr)
                     if debuglevel >= 2:
                         #print(ET.tostring(ref_elem, pretty_print=True).decode())
-                        print(f"DEBUG: ref_elem: {ref_elem.get(dep_attr)}")
+                        print(f"DEBUG: ref_elem: {dep_ref}")
                         print(f"DEBUG: Processing element: {ref_elem.tag}, type attribute: {ref_elem.get('type')}")
-                    dep_ref = ref_elem.get(dep_attr)
                     if dep_ref and ":" not in dep_ref:  # Local reference (no prefix)
-                        if dep_attr in ["type", "base"]:
-                            resolve_reference(dep_ref, "simpleType")
-                            resolve_reference(dep_ref, "complexType")
+                        if dep_attr in ("type", "base"):
+                            for kind in type_kinds(dep_ref):
+                                pending.append((dep_ref, kind, None))
                         elif dep_attr == "ref":
-                            if ref_elem.tag == f"{{{xs_ns}}}element":
-                                resolve_reference(dep_ref, "element")
-                            elif ref_elem.tag == f"{{{xs_ns}}}attribute":
-                                resolve_reference(dep_ref, "attribute")
+                            if ref_elem.tag == element_tag:
+                                pending.append((dep_ref, "element", None))
+                            elif ref_elem.tag == attribute_tag:
+                                pending.append((dep_ref, "attribute", None))
                         elif dep_attr == "group":
-                            resolve_reference(dep_ref, "group")
-
-            # Handle inline complexType or simpleType
-            inline_type = definition.find(".//xs:complexType", namespaces={"xs": xs_ns})
-            if inline_type is None:  # If no complexType, check for simpleType
-                inline_type = definition.find(".//xs:simpleType", namespaces={"xs": xs_ns})
-
-            # Do not treat inline types as global definitions
-            if inline_type is not None:
-                if "name" not in inline_type.attrib:  # Inline type
-                    if debuglevel >= 2:
-                        print(f"DEBUG: Skipping inline type for: {ref} ({ref_type})")
-                else:  # Only include named types
-                    if debuglevel >= 2:
-                        print(f"DEBUG: Resolving named inline type for: {ref} ({ref_type})")
-                    definitions["complexTypes" if inline_type.tag.endswith("complexType") else "simpleTypes"][ref] = inline_type
-
-
-        else:
-            print(f"WARNING: Definition for reference '{normalized_ref}' ({ref_type}) not found in schema.")
+                            pending.append((dep_ref, "group", None))
+
+            # The inline type check goes below the dependencies, which are popped in document order
+            stack.append((ref, ref_type, definition))
+            stack.extend(reversed(pending))
+
+    def resolve_inline_type(ref, ref_type, definition):
+        # Handle inline complexType or simpleType: the first complexType child of the definition,
+        # else the first simpleType child (the XSD grammar puts an inline type directly below its owner)
+        inline_type = None
+        for type_elem in definition.iterchildren(complex_type_tag, simple_type_tag):
+            if type_elem.tag == complex_type_tag:
+                inline_type = type_elem
+                break
+            if inline_type is None:
+                inline_type = type_elem
+
+        # Do not treat inline types as global definitions
+        if inline_type is not None:
+            if "name" not in inline_type.attrib:  # Inline type
+                if debuglevel >= 2:
+                    print(f"DEBUG: Skipping inline type for: {ref} ({ref_type})")
+            else:  # Only include named types
+                if debuglevel >= 2:
+                    print(f"DEBUG: Resolving named inline type for: {ref} ({ref_type})")
+                definitions["complexTypes" if inline_type.tag.endswith("complexType") else "simpleTypes"][ref] = inline_type
 
     # Start by resolving the initial set of references
+    # (type="..." references come as both a simpleType and a complexType: skip the kind it isn't)
     for ref, ref_type in references:
+        if ref_type in ("simpleType", "complexType") and ref_type not in type_kinds(ref):
+            continue
         if debuglevel >= 2:
             print(f"DEBUG: Initial reference to resolve: {ref} ({ref_type})")
         resolve_reference(ref, ref_type)
@@ -119,6 +187,7 @@ def resolve_dependencies(tree, references, xs_ns, debuglevel):
 def rename_and_copy_definitions(definitions, prefix, xs_ns, debuglevel,excluded_items):
     """Rename and copy the required definitions with the prefix."""
     renamed_definitions = []
+    schema_tag = f"{{{xs_ns}}}schema"
     #print (f"definitions.items: {definitions.items()}")
     for ref_type, defs in definitions.items():
         if debuglevel >= 2:
@@ -129,35 +198,34 @@ def rename_and_copy_definitions(definitions, prefix, xs_ns, debuglevel,excluded_
                 if debuglevel >= 2:
                     print(f"DEBUG: Processing definition: {ref}, Tag: {definition.tag}")
 
-                # Create a deep copy of the definition without copying the nsmap for every child
-                definition_copy = ET.Element(definition.tag)
+                # Create a deep copy of the definition, with its text, tail and children
+                definition_copy = copy.deepcopy(definition)
+                definition_copy.tail = None
 
-                # Copy relevant attributes while excluding usage-specific ones like 'minOccurs', 'maxOccurs', etc.
-                for key, value in definition.attrib.items():
-                    if debuglevel >= 2:
-                        print(f"DEBUG: definition.attrib.items: key={key}, value={str(value)}")
-                    if key not in ["minOccurs", "maxOccurs", "nillable", "use"]:
-                        definition_copy.set(key, str(value))
+                # Drop usage-specific attributes like 'minOccurs', 'maxOccurs', etc.
+                copy_attrib = definition_copy.attrib
+                for key in _DROP_ATTRS:
+                    copy_attrib.pop(key, None)
 
                 if debuglevel >= 2:
-                    print (f"DEBUG: definition_copy.attrib: {definition_copy.attrib}")
-                if "name" in definition_copy.attrib:
+                    print (f"DEBUG: definition_copy.attrib: {copy_attrib}")
+                if "name" in copy_attrib:
                     if debuglevel >= 2:
-                        print (f"DEBUG: Processing copy of {definition_copy.attrib['name']}")
+                        print (f"DEBUG: Processing copy of {copy_attrib['name']}")
                     original_name = definition.attrib["name"]
                     #parent = definition.getparent()
                     #print (parent.tag)
 
-                    # Check if the element or type is global
-
-                    is_global = definition.getroottree().getpath(definition).startswith("/xs:schema/")
-                    #is_global = parent.tag == f"{{{xs_ns}}}schema" if parent is not None else False
+                    # Check if the element or type is global: every definition below the sub schema's
+                    # root counts, since local ones found by the fallback search are copied to the top level
+                    schema_root = definition.getroottree().getroot()
+                    is_global = definition is not schema_root and schema_root.tag == schema_tag
 
                     if is_global:
                         # Rename global definitions
-                        renamed_name = f"{prefix}{original_name}"
+                        renamed_name = prefix + original_name
                         if original_name not in excluded_items:
-                            definition_copy.attrib["name"] = renamed_name
+                            copy_attrib["name"] = renamed_name
                             if debuglevel >= 2:
                                 print(f"DEBUG: Renamed global definition from '{original_name}' to '{renamed_name}'")
                     else:
@@ -166,67 +234,52 @@ def rename_and_copy_definitions(definitions, prefix, xs_ns, debuglevel,excluded_
                             print(f"DEBUG: Skipped renaming local definition: {original_name}")
 
                 # Rename references in the top-level definition's attributes
-                for dep_attr in ["type", "ref", "base"]:
-                    if dep_attr in definition_copy.attrib:
-                        dep_ref = definition_copy.attrib[dep_attr]
+                for dep_attr in _REF_ATTRS:
+                    dep_ref = copy_attrib.get(dep_attr)
+                    if dep_ref is not None:
                         if ":" not in dep_ref and dep_ref not in excluded_items:  # Local reference
-                            new_ref = f"{prefix}{dep_ref}"
-                            definition_copy.attrib[dep_attr] = new_ref
+                            new_ref = prefix + dep_ref
+                            copy_attrib[dep_attr] = new_ref
                             if debuglevel >= 2:
                                 print(f"DEBUG: Updated attribute '{dep_attr}' from '{dep_ref}' to '{new_ref}'")
 
-                # Recursively rename all children and attributes in the definition
-                def recursive_rename(element, parent):
+                # Rename all children and attributes in the definition, in a single pass over the copy
+                for element in definition_copy.iter():
+                    # Drop indentation-only text and tails, so the copy is re-indented when pretty-printed
+                    if element.text is not None and len(element) and not element.text.strip():
+                        element.text = None
+                    if element.tail is not None and not element.tail.strip():
+                        element.tail = None
+
+                    if element is definition_copy:
+                        continue
                     if not isinstance(element.tag, str):
                         if debuglevel >= 2:
                             print(f"DEBUG: Skipping non-element node: {element.tag}")
-                        return
+                        continue
 
                     if debuglevel >= 2:
-                        print(f"DEBUG: Recursively processing element: {element.tag}, Parent: {parent.tag}")
-
-                    # Create a deep copy of the child element without copying nsmap
-                    element_copy = ET.Element(element.tag)
-
-                    # Copy relevant attributes while excluding usage-specific ones like 'minOccurs', 'maxOccurs', 'nillable', 'use'
-                    for key, value in element.attrib.items():
-                        #if key not in ["minOccurs", "maxOccurs", "nillable", "use"]:  # Removed 'use' attribute if present
-                        #    element_copy.set(key, str(value))
-                        element_copy.set(key, str(value))
-
-                    # Copy text content, if available
-                    if element.text:
-                        element_copy.text = element.text
+                        print(f"DEBUG: Processing element: {element.tag}, Parent: {element.getparent().tag}")
 
                     # Rename reference attributes in the child
-                    for dep_attr in ["type", "ref", "base"]:
-                        if dep_attr in element_copy.attrib:
-                            dep_ref = element_copy.attrib[dep_attr]
+                    attrib = element.attrib
+                    for dep_attr in _REF_ATTRS:
+                        dep_ref = attrib.get(dep_attr)
+                        if dep_ref is not None:
                             if ":" not in dep_ref and dep_ref not in excluded_items:  # Local reference
-                                new_ref = f"{prefix}{dep_ref}"
-                                element_copy.attrib[dep_attr] = new_ref
+                                new_ref = prefix + dep_ref
+                                attrib[dep_attr] = new_ref
                                 if debuglevel >= 2:
                                     print(f"DEBUG: Updated child attribute '{dep_attr}' from '{dep_ref}' to '{new_ref}'")
 
                     # Rename 'name' attribute if the child itself is a definition
-                    if "name" in element_copy.attrib and element.attrib["name"] not in excluded_items:
-                        original_name = element.attrib["name"]
-                        renamed_name = f"{prefix}{original_name}"
-                        element_copy.attrib["name"] = renamed_name
+                    original_name = attrib.get("name")
+                    if original_name is not None and original_name not in excluded_items:
+                        renamed_name = prefix + original_name
+                        attrib["name"] = renamed_name
                         if debuglevel >= 2:
                             print(f"DEBUG: Renamed child definition from '{original_name}' to '{renamed_name}'")
 
-                    # Append the copied child to the parent
-                    parent.append(element_copy)
-
-                    # Recursively handle the element's children
-                    for child in element:
-                        recursive_rename(child, element_copy)
-
-                # Handle the root element's children
-                for child in definition:
-                    recursive_rename(child, definition_copy)
-
                 renamed_definitions.append(definition_copy)
             else:
                 print(f"WARNING: Expected an XML element, but got a different type for reference '{ref}'")
@@ -235,34 +288,35 @@ def rename_and_copy_definitions(definitions, prefix, xs_ns, debuglevel,excluded_
 
 
 
-def create_sub_include(main_xsd_file, sub_xsd_file, sub_include_file, prefix, debuglevel,excluded_items):
-    """Create sub_include.xsd with only the definitions needed by main.xsd."""
+def create_sub_include(main_xsd, sub_xsd_file, sub_include_file, prefix, debuglevel,excluded_items, pretty_print=True):
+    """Create sub_include.xsd with only the definitions needed by main.xsd (main and sub each a path or a parsed tree, not modified)."""
     # Parse main and sub XSDs
-    main_tree = ET.parse(main_xsd_file)
+    main_tree = parse_xsd(main_xsd)
     main_root = main_tree.getroot()
-    sub_tree = ET.parse(sub_xsd_file)
+    sub_tree = parse_xsd(sub_xsd_file)
     sub_root = sub_tree.getroot()
 
     xs_ns = main_root.nsmap.get("xs", "http://www.w3.org/2001/XMLSchema")
 
     # Collect initial references from main.xsd
+    # (type and ref attributes are checked in a single pass over main.xsd)
     references = set()
-    for type_elem in main_root.findall(".//*[@type]", namespaces={"xs": xs_ns}):
-        ref = type_elem.get("type")
-        if ref and ref.startswith(f"{prefix[:-1]}:"):  # Matches the sub namespace
-            local_name = ref.split(":")[1]
+    sub_prefix = f"{prefix[:-1]}:"
+    local_start = len(sub_prefix)  # Local names are sliced off past the sub namespace prefix
+    attribute_tag = f"{{{xs_ns}}}attribute"
+    for elem in main_root.iter(ET.Element):
+        ref = elem.get("type")
+        if ref and ref.startswith(sub_prefix):  # Matches the sub namespace
+            local_name = ref[local_start:]
             references.add((local_name, "simpleType"))
             references.add((local_name, "complexType"))
 
-    for ref_elem in main_root.findall(".//*[@ref]", namespaces={"xs": xs_ns}):
-        ref = ref_elem.get("ref")
-        if ref and ref.startswith(f"{prefix[:-1]}:"):  # Matches the sub namespace
-            references.add((ref.split(":")[1], "element"))  # Extract local name, element type
-
-    for attr_elem in main_root.findall(".//xs:attribute[@ref]", namespaces={"xs": xs_ns}):
-        ref = attr_elem.get("ref")
-        if ref and ref.startswith(f"{prefix[:-1]}:"):
-            references.add((ref.split(":")[1], "attribute"))
+        ref = elem.get("ref")
+        if ref and ref.startswith(sub_prefix):  # Matches the sub namespace
+            local_name = ref[local_start:]
+            references.add((local_name, "element"))  # Extract local name, element type
+            if elem.tag == attribute_tag:
+                references.add((local_name, "attribute"))
 
     if debuglevel >= 2:
         print("DEBUG: ***References: ***", sorted(references))
@@ -291,73 +345,70 @@ def create_sub_include(main_xsd_file, sub_xsd_file, sub_include_file, prefix, de
 
     # Create a new sub_include.xsd with only required definitions
     # Set nsmap only at the root level, excluding unnecessary namespaces
-    new_root_nsmap = {k: v for k, v in sub_root.nsmap.items() if k in ["xs"]}  # Retain only xs namespace
-    new_root = ET.Element("{" + xs_ns + "}schema", nsmap=new_root_nsmap)
-    new_root.attrib["elementFormDefault"] = sub_root.attrib.get("elementFormDefault", "qualified")
-    # Remove targetNamespace for the included schema to avoid conflicts
-    if "targetNamespace" in new_root.attrib:
-        del new_root.attrib["targetNamespace"]
-
-    for definition in renamed_definitions:
-        new_root.append(definition)
+    new_root_nsmap = {k: v for k, v in sub_root.nsmap.items() if k == "xs"}  # Retain only xs namespace
+    # No targetNamespace is carried over, so the included schema doesn't conflict with main.xsd
+    new_root = ET.Element(
+        "{" + xs_ns + "}schema",
+        {"elementFormDefault": sub_root.get("elementFormDefault", "qualified")},
+        nsmap=new_root_nsmap,
+    )
+    new_root.extend(renamed_definitions)
 
     # Ensure all references in the new schema are resolved
     for ref, ref_type in references:
         ref_plural = f"{ref_type}s"
+        if ref_type in ("simpleType", "complexType"):
+            # A type="..." reference is satisfied by either kind
+            if ref in required_definitions["simpleTypes"] or ref in required_definitions["complexTypes"]:
+                continue
         if ref_plural in required_definitions and ref not in required_definitions[ref_plural]:
             print(f"WARNING: Reference '{ref}' ({ref_type}) is missing in the included definitions.")
 
     # Save the new sub_include.xsd
     new_tree = ET.ElementTree(new_root)
-    new_tree.write(sub_include_file, pretty_print=True, xml_declaration=True, encoding="UTF-8")
+    new_tree.write(sub_include_file, pretty_print=pretty_print, xml_declaration=True, encoding="UTF-8")
     if debuglevel:
         print(f"INFO: Created selective included XSD: {sub_include_file}")
 
 
-def update_main_xsd(main_xsd_file, sub_include_file, output_main_xsd, prefix, debuglevel, excluded_items):
-    """Replace xs:import with xs:include in the main XSD, update references, and preserve comments."""
-    tree = ET.parse(main_xsd_file)
+def update_main_xsd(main_xsd, sub_include_file, output_main_xsd, prefix, debuglevel, excluded_items, pretty_print=True,
+                    main_xsd_file=None):
+    """
+    Replace xs:import with xs:include in the main XSD (a path or a parsed tree, modified in place), update references, and preserve comments.
+    main_xsd_file is the path reported for the main XSD, by default main_xsd itself when that is a path.
+    """
+    tree = parse_xsd(main_xsd)
+    if main_xsd_file is None:
+        main_xsd_file = main_xsd if isinstance(main_xsd, (str, os.PathLike)) else tree.docinfo.URL
     root = tree.getroot()
     xs_ns = root.nsmap.get("xs", "http://www.w3.org/2001/XMLSchema")
 
-    # Collect comments and their positions
-    comments = []
-    for parent in root.iter():
-        for child in parent:
-            if isinstance(child, ET._Comment):
-                comments.append((parent, child.getprevious(), child.text))
-                parent.remove(child)  # Temporarily remove comment
-
-    # Update references in main.xsd
-
-    for ref_elem in root.findall(".//*[@ref]", namespaces={"xs": xs_ns}):
-        old_ref = ref_elem.get("ref")
-        if old_ref and old_ref.startswith(f"{prefix[:-1]}:"):
-            ref_local_name = old_ref.split(":", 1)[1]
+    # Update references in main.xsd (ref, type and base are rewritten in a single pass)
+    sub_prefix = f"{prefix[:-1]}:"
+    local_start = len(sub_prefix)  # Local names are sliced off past the sub namespace prefix
+    for elem in root.iter(ET.Element):
+        old_ref = elem.get("ref")
+        if old_ref and old_ref.startswith(sub_prefix):
+            ref_local_name = old_ref[local_start:]
             if ref_local_name in excluded_items:
                 new_ref = ref_local_name  # Keep original name without prefix
             else:
-                new_ref = f"{prefix}{ref_local_name}"  # Add prefix
-            ref_elem.set("ref", new_ref)
+                new_ref = prefix + ref_local_name  # Add prefix
+            elem.set("ref", new_ref)
             if debuglevel >= 2:
                 print(f"DEBUG: Updated reference: {old_ref} -> {new_ref}")
-            # Log all attributes to ensure they are preserved
-            #attributes = ref_elem.attrib  # Get all attributes
-            #print(f"Element attributes: {attributes}")
-
-    for type_elem in root.findall(".//*[@type]", namespaces={"xs": xs_ns}):
-        old_type = type_elem.get("type")
-        if old_type and old_type.startswith(f"{prefix[:-1]}:"):
-            new_type = f"{prefix}{old_type.split(':', 1)[1]}"
-            type_elem.set("type", new_type)
+
+        old_type = elem.get("type")
+        if old_type and old_type.startswith(sub_prefix):
+            new_type = prefix + old_type[local_start:]
+            elem.set("type", new_type)
             if debuglevel >= 2:
                 print(f"DEBUG: Updated type: {old_type} -> {new_type}")
 
-    for base_elem in root.findall(".//*[@base]", namespaces={"xs": xs_ns}):
-        old_base = base_elem.get("base")  # Get the current value of the base attribute
-        if old_base and old_base.startswith(f"{prefix[:-1]}:"):  # Check if it starts with the namespace prefix
-            new_base = f"{prefix}{old_base.split(':', 1)[1]}"  # Replace prefix with the updated one
-            base_elem.set("base", new_base)  # Update the base attribute
+        old_base = elem.get("base")  # Get the current value of the base attribute
+        if old_base and old_base.startswith(sub_prefix):  # Check if it starts with the namespace prefix
+            new_base = prefix + old_base[local_start:]  # Replace prefix with the updated one
+            elem.set("base", new_base)  # Update the base attribute
             if debuglevel >= 2:
                 print(f"DEBUG: Updated base: {old_base} -> {new_base}")
 
@@ -373,42 +424,42 @@ def update_main_xsd(main_xsd_file, sub_include_file, output_main_xsd, prefix, de
         imp.attrib["schemaLocation"] = sub_include_file
 
 
-    # Reattach comments with proper handling
-    attached_comments = set()
-    for parent, previous, text in comments:
-        if text not in attached_comments:  # Avoid duplicates
-            comment = ET.Comment(text)
-            attached_comments.add(text)
-
-            # Insert the comment and ensure a newline follows it
-            if previous is not None:
-                parent.insert(parent.index(previous) + 1, comment)
-            else:
-                parent.insert(0, comment)
-
     # Save the modified main.xsd
-    tree.write(output_main_xsd, pretty_print=True, xml_declaration=True, encoding="UTF-8")
+    tree.write(output_main_xsd, pretty_print=pretty_print, xml_declaration=True, encoding="UTF-8")
     print(f"INFO: Processed {main_xsd_file} saved as: {output_main_xsd}")
 
 
-def xsd_import2include(main_xsd_file,exclude_file,debuglevel):
-    excluded_items = read_exclude_file(exclude_file)
+def xsd_import2include(main_xsd_file,exclude_file,debuglevel, pretty_print=True, include_per_main=False):
+    """
+    Turn the first <xs:import> of main_xsd_file into an <xs:include> of a selective, renamed copy of the sub XSD.
+    With pretty_print=False both output files are written without indentation, which is faster on large schemas.
+    The copy is saved as <sub>_include.xsd, or as <main>_<sub>_include.xsd with include_per_main=True, so that
+    main XSDs importing the same sub XSD each get the definitions they need.
+    Returns (output_main_xsd, sub_include_file), or None if there is no <xs:import> to process.
+    """
+    excluded_items = read_exclude_file(exclude_file, debuglevel)
     main_xsd_basename = os.path.basename(main_xsd_file)
 
     # Parse main.xsd to identify sub.xsd and determine prefix
-    main_tree = ET.parse(main_xsd_file)
+    main_tree = parse_xsd(main_xsd_file)
     main_root = main_tree.getroot()
     xs_ns = main_root.nsmap.get("xs", "http://www.w3.org/2001/XMLSchema")
     sub_ns = None
     sub_xsd_file = None
     prefix = None
 
-    for imp in main_root.findall(".//xs:import", namespaces={"xs": xs_ns}):
+    # Reverse namespace map (URI -> first prefix declared for it)
+    prefixes = {}
+    for p, ns in main_root.nsmap.items():
+        prefixes.setdefault(ns, p)
+
+    # Only the first <xs:import> is processed
+    imp = next(main_root.iterfind(".//xs:import", namespaces={"xs": xs_ns}), None)
+    if imp is not None:
         sub_ns = imp.get("namespace")
         sub_xsd_file = imp.get("schemaLocation")
-        prefix = [p for p, ns in main_root.nsmap.items() if ns == sub_ns]
-        prefix = prefix[0] + "_" if prefix else ""
-        break
+        prefix = prefixes.get(sub_ns)
+        prefix = prefix + "_" if prefix else ""
 
     if not sub_xsd_file or not prefix:
         print("INFO: No valid <xs:import> found in the main XSD.")
@@ -419,7 +470,10 @@ def xsd_import2include(main_xsd_file,exclude_file,debuglevel):
     sub_xsd_basename = os.path.basename(sub_xsd_file)
 
     # Set output filenames
-    sub_include_file = os.path.join(os.path.dirname(sub_xsd_file), f"{sub_xsd_basename.replace('.xsd', '_include.xsd')}")
+    sub_include_basename = sub_xsd_basename.replace('.xsd', '_include.xsd')
+    if include_per_main:
+        sub_include_basename = f"{os.path.splitext(main_xsd_basename)[0]}_{sub_include_basename}"
+    sub_include_file = os.path.join(os.path.dirname(sub_xsd_file), sub_include_basename)
     output_main_xsd = os.path.join(os.path.dirname(main_xsd_file), f"{main_xsd_basename.replace('.xsd', '_processed.xsd')}")
 
     if debuglevel:
@@ -428,18 +482,32 @@ def xsd_import2include(main_xsd_file,exclude_file,debuglevel):
         print(f"INFO: Sub XSD file: {sub_xsd_file}")
 
     # Process sub.xsd selectively
-    create_sub_include(main_xsd_file, sub_xsd_file, sub_include_file, prefix, debuglevel, excluded_items)
+    # (main.xsd is only parsed once: both steps share main_tree, which is only modified by the second)
+    create_sub_include(main_tree, sub_xsd_file, sub_include_file, prefix, debuglevel, excluded_items, pretty_print)
     #create_sub_include(main_xsd_file, sub_xsd_file, sub_include_file, prefix, debuglevel)
     # Process main.xsd
-    update_main_xsd(main_xsd_file, sub_include_file, output_main_xsd, prefix, debuglevel, excluded_items)
+    update_main_xsd(main_tree, sub_include_file, output_main_xsd, prefix, debuglevel, excluded_items, pretty_print,
+                    main_xsd_file)
 
     return (output_main_xsd, sub_include_file)
 
 
+def process_xsd(main_xsd_file, exclude_file, debuglevel, pretty_print=True):
+    """
+    Run xsd_import2include() on one of several main XSDs, returning its result and everything it printed.
+    Each main XSD gets its own include file, since others may import the same sub XSD.
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = xsd_import2include(main_xsd_file, exclude_file, debuglevel, pretty_print, include_per_main=True)
+    return result, output.getvalue()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Changes 'import' statements of an XSD file into 'include' statements.")
-    parser.add_argument("mainxsd", help="Path to the XSD file to be processed.")
+    parser.add_argument("mainxsd", nargs="+", help="Path to the XSD file(s) to be processed; several files are processed in parallel.")
     parser.add_argument("-e", "--exclude", help="Path to the exclude file (optional).")
+    parser.add_argument("--no-pretty", action="store_true", help="Write the output files without indentation (faster on large schemas).")
 
     # Create a mutually exclusive group for -v and -d
     group = parser.add_mutually_exclusive_group()
@@ -450,7 +518,7 @@ def main():
 
     debuglevel = 0
 
-    main_xsd_file = args.mainxsd
+    main_xsd_files = args.mainxsd
     if args.verbose:
         print("INFO: Verbose mode enabled.")
         debuglevel = 1
@@ -459,11 +527,25 @@ def main():
         debuglevel = 2
         
 
-    (output_main_xsd, sub_include_file) = xsd_import2include(main_xsd_file,args.exclude,debuglevel)
-    print(f"INFO: Output Main XSD file: {output_main_xsd}")
-    print(f"INFO: Sub Include file: {sub_include_file}")
+    def report(result):
+        if result is None:  # No <xs:import> to process
+            return
+        (output_main_xsd, sub_include_file) = result
+        print(f"INFO: Output Main XSD file: {output_main_xsd}")
+        print(f"INFO: Sub Include file: {sub_include_file}")
+
+    if len(main_xsd_files) == 1:
+        report(xsd_import2include(main_xsd_files[0], args.exclude, debuglevel, not args.no_pretty))
+        return
+
+    # Each main XSD is processed independently in its own process; the output of each
+    # one is printed as a block, in the order the files were given
+    with ProcessPoolExecutor() as executor:
+        for result, output in executor.map(process_xsd, main_xsd_files, repeat(args.exclude), repeat(debuglevel),
+                                          repeat(not args.no_pretty)):
+            sys.stdout.write(output)
+            report(result)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,5 @@
+import lxml.etree as ET
+
+# Parser shared by the flattenxsd tools: no ID/IDREF hash table and no limit on
+# document size. Blank text is dropped so the outputs can be pretty-printed.
+PARSER = ET.XMLParser(remove_blank_text=True, collect_ids=False, huge_tree=True)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+xsd_audit.py
+
+Run all three XSD checks on a single schema, parsing it only once:
+  - orphan global definitions (find_orphans.py)
+  - definitions without <xs:annotation> (find_missing_annotations.py)
+  - annotation discrepancies between global definitions and their references
+    (find_annotation_discrepancies.py)
+The reports are the same as those printed by the individual scripts.
+
+Usage:
+    python xsd_audit.py /path/to/schema.xsd
+
+Run `python xsd_audit.py --help` for details.
+"""
+
+import sys
+import os
+import argparse
+from lxml import etree
+
+from find_orphans import find_orphans, print_orphans_report
+from find_missing_annotations import find_missing_annotations, print_missing_report
+# The discrepancy check compares <xs:documentation> text, so its text-keeping parser serves all checks
+from find_annotation_discrepancies import PARSER, iter_annotation_discrepancies, print_discrepancies_report
+
+# XML Schema namespace URI.
+XSD_NS = "http://www.w3.org/2001/XMLSchema"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Parse an XSD once and run every check on it: orphan global definitions,\n"
+            "definitions missing <xs:annotation>, and annotation discrepancies between\n"
+            "global definitions and their ref=\"...\" sites."
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "xsdfile",
+        metavar="XSD_FILE",
+        help="Path to the XSD file to audit",
+    )
+    args = parser.parse_args()
+
+    xsd_path = args.xsdfile
+    if not os.path.isfile(xsd_path):
+        print(f"Error: “{xsd_path}” does not exist or is not a file.")
+        sys.exit(1)
+
+    try:
+        tree = etree.parse(xsd_path, PARSER)
+    except (etree.XMLSyntaxError, OSError) as e:
+        print(f"Failed to parse “{xsd_path}”: {e}")
+        sys.exit(1)
+
+    if tree.getroot().tag != f"{{{XSD_NS}}}schema":
+        print("Warning: root element is not <xs:schema>. Proceeding anyway...")
+
+    # The scanners only read the tree, so the same parse is shared by all of them
+    print_orphans_report(xsd_path, find_orphans(tree))
+    print_missing_report(xsd_path, find_missing_annotations(tree))
+    print_discrepancies_report(xsd_path, iter_annotation_discrepancies(tree))
+
+
+if __name__ == "__main__":
+    main()